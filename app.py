@@ -1,16 +1,38 @@
 import os
+import re
+import sys
+import atexit
+import signal
+import gzip
 import json
-from datetime import datetime
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify
+import time
+import hashlib
+import mimetypes
+import posixpath
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+import click
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, send_file, abort
+from flask.cli import AppGroup
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField, SelectField
 from wtforms.validators import DataRequired, Email, Length, EqualTo
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import safe_join
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import deferred, load_only, undefer_group
 
-# Создаем экземпляр Flask
-app = Flask(__name__, instance_relative_config=True)
+try:
+    import brotli  # Необязательная зависимость: без нее собираются только .gz
+except ImportError:
+    brotli = None
+
+# Создаем экземпляр Flask. INSTANCE_PATH позволяет держать базы в другой папке (например, в тестах)
+app = Flask(__name__, instance_relative_config=True, instance_path=os.environ.get('INSTANCE_PATH'))
 
 # Убедимся, что папка instance существует
 try:
@@ -22,6 +44,20 @@ except OSError:
 app.config['SECRET_KEY'] = 'dev-secret-key-change-in-production'  # Для продакшена используйте .env файл
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(app.instance_path, "database.db")}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Архив старых решений хранится в отдельном файле, чтобы основная таблица оставалась маленькой
+app.config['SQLALCHEMY_BINDS'] = {
+    'archive': f'sqlite:///{os.path.join(app.instance_path, "archive.db")}'
+}
+app.config['SUBMISSIONS_HOT_LIMIT'] = 5  # Сколько последних решений на пару (пользователь, задание) держать в основной БД
+app.config['SUBMISSIONS_ARCHIVE_BATCH'] = 500  # Размер пачки при переносе в архив
+app.config['SUBMISSIONS_ARCHIVE_MAX_BATCHES'] = 20  # Ограничение на число пачек за один запуск по расписанию
+app.config['JOBS_POLL_INTERVAL'] = 30  # Как часто воркер проверяет расписание, секунд
+app.config['JOBS_HISTORY_DAYS'] = 30  # Сколько дней хранить историю запусков
+app.config['JOBS_LEASE_MARGIN'] = 60  # Запас аренды сверх таймаута задачи, секунд
+app.config['JOBS_STUCK_LEASE'] = 6 * 60 * 60  # Сколько держать аренду зависшей задачи, секунд
+app.config['ASSETS_DIST_DIR'] = os.path.join(app.static_folder, 'dist')  # Собранная статика с хешами в именах
+app.config['ASSETS_MAX_AGE'] = 365 * 24 * 60 * 60  # Хешированные файлы не меняются, кэшируем на год
+app.config['API_BATCH_MAX_IDS'] = 100  # Максимум заданий в одном batch-запросе
 
 # Инициализация базы данных
 db = SQLAlchemy(app)
@@ -60,8 +96,9 @@ class Task(db.Model):
     estimated_time = db.Column(db.String(50))
     salary_range = db.Column(db.String(100))
     company = db.Column(db.String(100))
-    requirements = db.Column(db.Text)
-    solution_template = db.Column(db.Text)
+    # Тяжелые колонки нужны только на странице задания и грузятся отдельно
+    requirements = deferred(db.Column(db.Text), group='task_body')
+    solution_template = deferred(db.Column(db.Text), group='task_body')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class UserTask(db.Model):
@@ -73,6 +110,10 @@ class UserTask(db.Model):
     completed_at = db.Column(db.DateTime)
     progress = db.Column(db.Integer, default=0)  # 0-100%
 
+    __table_args__ = (
+        db.Index('uq_user_task', 'user_id', 'task_id', unique=True),
+    )
+
 class TaskSubmission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -83,10 +124,50 @@ class TaskSubmission(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, reviewed, accepted
     review_comments = db.Column(db.Text)
 
+    __table_args__ = (
+        db.Index('ix_task_submission_user_task', 'user_id', 'task_id', 'submitted_at'),
+    )
+
+class ArchivedSubmission(db.Model):
+    """Append-only архив решений, вытесненных из основной таблицы"""
+    __bind_key__ = 'archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # id из task_submission
+    user_id = db.Column(db.Integer, nullable=False)
+    task_id = db.Column(db.Integer, nullable=False)
+    code = db.Column(db.Text)
+    comments = db.Column(db.Text)
+    submitted_at = db.Column(db.DateTime)
+    status = db.Column(db.String(20))
+    review_comments = db.Column(db.Text)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_archived_submission_user_task', 'user_id', 'task_id', 'submitted_at'),
+    )
+
+class ScheduledJob(db.Model):
+    name = db.Column(db.String(100), primary_key=True)
+    schedule = db.Column(db.String(100), nullable=False)  # "interval:<секунды>" или cron "*/15 * * * *"
+    paused = db.Column(db.Boolean, default=False, nullable=False)
+    next_run_at = db.Column(db.DateTime)
+    lease_owner = db.Column(db.String(100))  # Воркер, который сейчас выполняет задачу
+    lease_expires_at = db.Column(db.DateTime)
+
+class JobRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(100), nullable=False, index=True)
+    worker = db.Column(db.String(100))
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    status = db.Column(db.String(20), default='running')  # running, success, failed, timeout
+    duration_ms = db.Column(db.Integer)
+    error = db.Column(db.Text)
+
 class Theory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    content = deferred(db.Column(db.Text, nullable=False), group='theory_body')
     category = db.Column(db.String(50), nullable=False)
     technology = db.Column(db.String(100))
     difficulty = db.Column(db.String(20))
@@ -100,6 +181,499 @@ class Roadmap(db.Model):
     steps = db.Column(db.Text)  # JSON с шагами roadmap
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+# Поля, которые показываются в карточках списков
+TASK_CARD_FIELDS = ('id', 'title', 'description', 'difficulty', 'category', 'technology',
+                    'estimated_time', 'salary_range', 'company', 'created_at')
+THEORY_CARD_FIELDS = ('id', 'title', 'category', 'technology', 'difficulty', 'created_at')
+
+def task_cards_query():
+    """Запрос заданий для списков: только поля карточки"""
+    return Task.query.options(load_only(*[getattr(Task, field) for field in TASK_CARD_FIELDS]))
+
+def theory_cards_query():
+    """Запрос теории для списков: без текста материала"""
+    return Theory.query.options(load_only(*[getattr(Theory, field) for field in THEORY_CARD_FIELDS]))
+
+ARCHIVED_SUBMISSION_FIELDS = ('id', 'user_id', 'task_id', 'code', 'comments',
+                              'submitted_at', 'status', 'review_comments')
+
+def archive_submissions(keep=None, batch_size=None, max_batches=None):
+    """Перенос старых решений в архив.
+
+    В основной БД остаются последние keep решений на каждую пару (пользователь, задание).
+    Каждая пачка — две короткие транзакции: сначала запись в архив, затем удаление
+    из основной таблицы. Повторная вставка в архив игнорируется, поэтому прерванный
+    перенос безопасно запускать снова.
+    """
+    keep = app.config['SUBMISSIONS_HOT_LIMIT'] if keep is None else keep
+    batch_size = app.config['SUBMISSIONS_ARCHIVE_BATCH'] if batch_size is None else batch_size
+
+    # Ранжируем только пары, у которых решений больше keep: группировка идет по индексу
+    # ix_task_submission_user_task, и сортировать приходится лишь переполненные группы
+    crowded = db.session.query(TaskSubmission.user_id, TaskSubmission.task_id) \
+        .group_by(TaskSubmission.user_id, TaskSubmission.task_id) \
+        .having(db.func.count(TaskSubmission.id) > keep) \
+        .subquery()
+    ranked = db.session.query(
+        TaskSubmission.id,
+        db.func.row_number().over(
+            partition_by=(TaskSubmission.user_id, TaskSubmission.task_id),
+            order_by=(TaskSubmission.submitted_at.desc(), TaskSubmission.id.desc())
+        ).label('position')
+    ).join(crowded, db.and_(
+        TaskSubmission.user_id == crowded.c.user_id,
+        TaskSubmission.task_id == crowded.c.task_id
+    )).subquery()
+
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = [row.id for row in db.session.query(ranked.c.id)
+               .filter(ranked.c.position > keep)
+               .order_by(ranked.c.id)
+               .limit(batch_size)]
+        if not ids:
+            break
+
+        submissions = TaskSubmission.query.filter(TaskSubmission.id.in_(ids)).all()
+        rows = [{field: getattr(submission, field) for field in ARCHIVED_SUBMISSION_FIELDS}
+                for submission in submissions]
+        db.session.execute(
+            sqlite_insert(ArchivedSubmission).on_conflict_do_nothing(index_elements=['id']),
+            rows
+        )
+        db.session.commit()
+
+        TaskSubmission.query.filter(TaskSubmission.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+        archived += len(ids)
+        batches += 1
+    return archived
+
+def get_archived_submissions(user_id, task_id):
+    """Архивные решения пользователя по заданию, новые первыми"""
+    return ArchivedSubmission.query.filter_by(user_id=user_id, task_id=task_id) \
+        .order_by(ArchivedSubmission.submitted_at.desc()).all()
+
+@app.cli.command('archive-submissions')
+@click.option('--keep', type=int, default=None, help='Сколько последних решений оставить в основной БД')
+@click.option('--batch-size', type=int, default=None, help='Размер пачки')
+@click.option('--max-batches', type=int, default=None, help='Ограничение на число пачек за запуск')
+def archive_submissions_command(keep, batch_size, max_batches):
+    """Перенести старые решения в архив"""
+    archived = archive_submissions(keep=keep, batch_size=batch_size, max_batches=max_batches)
+    click.echo(f'Перенесено в архив: {archived}')
+
+# Допустимые переходы статуса задания: целевой статус -> из каких статусов можно перейти.
+# completed -> in_progress разрешен, чтобы задание можно было выполнить повторно
+TASK_STATUS_TRANSITIONS = {
+    'in_progress': ('not_started', 'completed'),
+    'completed': ('in_progress',),
+}
+
+def transition_user_task(user_id, task_id, status):
+    """Перевести задание пользователя в новый статус одним SQL-запросом.
+
+    Проверка текущего статуса выполняется в самом запросе, поэтому параллельные
+    запросы не создают дубликатов и не перезаписывают друг друга.
+    Возвращает 'created', если запись создана, 'updated', если изменена существующая,
+    и None, если переход не допускается. Коммит остается за вызывающим кодом.
+    """
+    if status not in TASK_STATUS_TRANSITIONS:
+        raise ValueError(f'Неизвестный статус задания: {status}')
+    allowed_from = TASK_STATUS_TRANSITIONS[status]
+    now = datetime.utcnow()
+
+    if status == 'in_progress':
+        # Повторный старт сохраняет время первого старта, поэтому по started_at
+        # из RETURNING видно, создана ли запись этим запросом
+        table = UserTask.__table__
+        row = db.session.execute(
+            sqlite_insert(UserTask).values(
+                user_id=user_id,
+                task_id=task_id,
+                status='in_progress',
+                started_at=now,
+                progress=0
+            ).on_conflict_do_update(
+                index_elements=['user_id', 'task_id'],
+                set_={
+                    'status': 'in_progress',
+                    'progress': 0,
+                    'completed_at': None,
+                    'started_at': db.func.coalesce(table.c.started_at, now)
+                },
+                where=table.c.status.in_(allowed_from)
+            ).returning(UserTask.id, UserTask.started_at)
+        ).first()
+        if row is None:
+            return None
+        return 'created' if row.started_at == now else 'updated'
+
+    updated = db.session.execute(
+        db.update(UserTask).where(
+            UserTask.user_id == user_id,
+            UserTask.task_id == task_id,
+            UserTask.status.in_(allowed_from)
+        ).values(
+            status='completed',
+            progress=100,
+            completed_at=now
+        ).execution_options(synchronize_session=False)
+    )
+    return 'updated' if updated.rowcount == 1 else None
+
+def get_user_task_status(user_id, task_id):
+    return db.session.query(UserTask.status).filter_by(user_id=user_id, task_id=task_id).scalar()
+
+# Фоновые задачи
+JOBS = {}
+
+def job(name, every=None, cron=None, timeout=300):
+    """Регистрация фоновой задачи с интервалом в секундах (every) или cron-расписанием"""
+    if (every is None) == (cron is None):
+        raise ValueError('Нужно указать ровно одно из every или cron')
+    schedule = f'interval:{int(every)}' if every is not None else cron
+    next_run_time(schedule, datetime.utcnow())  # Проверяем расписание при регистрации
+
+    def decorator(func):
+        JOBS[name] = {'func': func, 'schedule': schedule, 'timeout': timeout}
+        return func
+    return decorator
+
+def _parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = map(int, part.split('-', 1))
+        else:
+            start = end = int(part)
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f'Некорректное поле cron: {field}')
+        values.update(range(start, end + 1, step))
+    return values
+
+def next_run_time(schedule, after):
+    """Ближайшее время запуска строго после after"""
+    if schedule.startswith('interval:'):
+        return after + timedelta(seconds=int(schedule.split(':', 1)[1]))
+
+    fields = schedule.split()
+    if len(fields) != 5:
+        raise ValueError(f'Cron-расписание должно состоять из 5 полей: {schedule}')
+    minutes = _parse_cron_field(fields[0], 0, 59)
+    hours = _parse_cron_field(fields[1], 0, 23)
+    days = _parse_cron_field(fields[2], 1, 31)
+    months = _parse_cron_field(fields[3], 1, 12)
+    weekdays = {day % 7 for day in _parse_cron_field(fields[4], 0, 7)}  # 0 и 7 — воскресенье
+    days_restricted, weekdays_restricted = fields[2] != '*', fields[4] != '*'
+
+    def day_matches(moment):
+        day_ok = moment.day in days
+        weekday_ok = (moment.weekday() + 1) % 7 in weekdays
+        # Как в cron: если заданы и день месяца, и день недели, достаточно совпадения одного
+        if days_restricted and weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = moment + timedelta(days=366 * 4)
+    while moment < limit:
+        if moment.month not in months or not day_matches(moment):
+            moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+        elif moment.hour not in hours:
+            moment = moment.replace(minute=0) + timedelta(hours=1)
+        elif moment.minute not in minutes:
+            moment += timedelta(minutes=1)
+        else:
+            return moment
+    raise ValueError(f'Расписание никогда не срабатывает: {schedule}')
+
+def _worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def sync_jobs():
+    """Создать записи для зарегистрированных задач и обновить изменившиеся расписания"""
+    now = datetime.utcnow()
+    for name, spec in JOBS.items():
+        next_run_at = next_run_time(spec['schedule'], now)
+        db.session.execute(
+            sqlite_insert(ScheduledJob).values(
+                name=name,
+                schedule=spec['schedule'],
+                paused=False,
+                next_run_at=next_run_at
+            ).on_conflict_do_update(
+                index_elements=['name'],
+                set_={'schedule': spec['schedule'], 'next_run_at': next_run_at},
+                where=ScheduledJob.__table__.c.schedule != spec['schedule']
+            )
+        )
+    db.session.commit()
+
+def claim_job(name, worker_id, force=False):
+    """Захват аренды задачи. Только один воркер получает True и выполняет запуск"""
+    now = datetime.utcnow()
+    conditions = [
+        ScheduledJob.name == name,
+        db.or_(ScheduledJob.lease_expires_at.is_(None), ScheduledJob.lease_expires_at < now)
+    ]
+    if not force:
+        conditions += [ScheduledJob.paused.is_(False), ScheduledJob.next_run_at <= now]
+    result = db.session.execute(
+        db.update(ScheduledJob).where(*conditions).values(
+            lease_owner=worker_id,
+            lease_expires_at=now + timedelta(seconds=JOBS[name]['timeout'] + app.config['JOBS_LEASE_MARGIN'])
+        ).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+def _release_job(name, worker_id):
+    """Снять аренду и назначить следующий запуск одним запросом"""
+    db.session.execute(
+        db.update(ScheduledJob).where(
+            ScheduledJob.name == name,
+            ScheduledJob.lease_owner == worker_id
+        ).values(
+            next_run_at=next_run_time(JOBS[name]['schedule'], datetime.utcnow()),
+            lease_owner=None,
+            lease_expires_at=None
+        ).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+# Запуски, превысившие таймаут в этом процессе: id запуска -> (задача, воркер)
+_stuck_runs = {}
+
+def _finish_run(run_id, error):
+    """Записать итог запуска. Если запуск уже помечен timeout, дописываем, чем он закончился"""
+    finished_at = datetime.utcnow()
+    started_at = db.session.query(JobRun.started_at).filter_by(id=run_id).scalar()
+    duration_ms = int((finished_at - started_at).total_seconds() * 1000)
+    result = db.session.execute(
+        db.update(JobRun).where(JobRun.id == run_id, JobRun.status == 'running').values(
+            status='failed' if error else 'success',
+            error=error,
+            finished_at=finished_at,
+            duration_ms=duration_ms
+        ).execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        note = f'Задача завершилась через {duration_ms} мс ' + (f'с ошибкой:\n{error}' if error else 'успешно')
+        db.session.execute(
+            db.update(JobRun).where(JobRun.id == run_id).values(
+                error=db.func.coalesce(JobRun.error + '\n', '') + note,
+                finished_at=finished_at,
+                duration_ms=duration_ms
+            ).execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+def _run_in_app_context(name, worker_id, run_id):
+    with app.app_context():
+        error = None
+        try:
+            JOBS[name]['func']()
+        except Exception:
+            error = traceback.format_exc()
+            db.session.rollback()
+        finally:
+            # Итог и снятие аренды записывает поток, выполнявший задачу, — даже после таймаута
+            _finish_run(run_id, error)
+            _release_job(name, worker_id)
+            _stuck_runs.pop(run_id, None)
+
+def _release_stuck_jobs():
+    """При выходе процесса потоки зависших задач погибают — снимаем их аренды"""
+    if not _stuck_runs:
+        return
+    with app.app_context():
+        for run_id, (name, worker_id) in list(_stuck_runs.items()):
+            db.session.execute(
+                db.update(JobRun).where(JobRun.id == run_id, JobRun.finished_at.is_(None)).values(
+                    error=JobRun.error + '\nПроцесс воркера завершился до окончания задачи'
+                ).execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            _release_job(name, worker_id)
+            _stuck_runs.pop(run_id, None)
+
+atexit.register(_release_stuck_jobs)
+
+def run_job(name, worker_id=None, force=False, wait=False):
+    """Выполнить задачу, если удалось захватить аренду. Возвращает JobRun или None.
+
+    Если задача не уложилась в таймаут, запуск помечается timeout. С wait=True вызов
+    дожидается окончания потока; иначе аренда продлевается до его завершения.
+    """
+    spec = JOBS[name]
+    worker_id = worker_id or _worker_id()
+    if not claim_job(name, worker_id, force=force):
+        return None
+
+    run = JobRun(job_name=name, worker=worker_id, started_at=datetime.utcnow(), status='running')
+    db.session.add(run)
+    db.session.commit()
+    run_id = run.id
+
+    # Задача выполняется в отдельном потоке со своим контекстом и сессией, чтобы ограничить время
+    thread = threading.Thread(target=_run_in_app_context, args=(name, worker_id, run_id), daemon=True)
+    thread.start()
+    thread.join(spec['timeout'])
+
+    if thread.is_alive():
+        timed_out = db.session.execute(
+            db.update(JobRun).where(JobRun.id == run_id, JobRun.status == 'running').values(
+                status='timeout',
+                error=f'Превышено время выполнения: {spec["timeout"]} с'
+            ).execution_options(synchronize_session=False)
+        ).rowcount == 1
+        if timed_out and wait:
+            db.session.commit()
+            thread.join()
+        elif timed_out:
+            # Поток нельзя остановить: продлеваем аренду, чтобы задачу не запустил другой
+            # воркер, пока этот запуск не закончится. При выходе процесса аренда снимается
+            _stuck_runs[run_id] = (name, worker_id)
+            db.session.execute(
+                db.update(ScheduledJob).where(
+                    ScheduledJob.name == name,
+                    ScheduledJob.lease_owner == worker_id
+                ).values(
+                    lease_expires_at=datetime.utcnow() + timedelta(seconds=app.config['JOBS_STUCK_LEASE'])
+                ).execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+
+    db.session.expire_all()
+    return db.session.get(JobRun, run_id)
+
+def run_due_jobs(worker_id=None):
+    """Один проход планировщика: запустить все задачи, время которых пришло"""
+    worker_id = worker_id or _worker_id()
+    due = [name for (name,) in db.session.query(ScheduledJob.name).filter(
+        ScheduledJob.paused.is_(False),
+        ScheduledJob.next_run_at <= datetime.utcnow(),
+        ScheduledJob.name.in_(list(JOBS))
+    )]
+    return [run for run in (run_job(name, worker_id) for name in due) if run is not None]
+
+@job('archive_submissions', every=15 * 60, timeout=600)
+def archive_submissions_job():
+    archive_submissions(max_batches=app.config['SUBMISSIONS_ARCHIVE_MAX_BATCHES'])
+
+@job('prune_job_runs', cron='0 3 * * *')
+def prune_job_runs_job():
+    cutoff = datetime.utcnow() - timedelta(days=app.config['JOBS_HISTORY_DAYS'])
+    JobRun.query.filter(JobRun.started_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+
+jobs_cli = AppGroup('jobs', help='Управление фоновыми задачами')
+app.cli.add_command(jobs_cli)
+
+def _get_job_or_fail(name):
+    if name not in JOBS:
+        raise click.ClickException(f'Неизвестная задача: {name}')
+    sync_jobs()
+    return db.session.get(ScheduledJob, name)
+
+@jobs_cli.command('list')
+def jobs_list_command():
+    """Список задач со статистикой запусков"""
+    sync_jobs()
+    stats = {
+        row.job_name: row for row in db.session.query(
+            JobRun.job_name,
+            db.func.count(JobRun.id).label('runs'),
+            db.func.sum(db.case((JobRun.status != 'success', 1), else_=0)).label('failures'),
+            db.func.avg(JobRun.duration_ms).label('avg_ms'),
+            db.func.max(JobRun.id).label('last_id')
+        ).group_by(JobRun.job_name)
+    }
+    last_runs = {run.id: run for run in JobRun.query.filter(
+        JobRun.id.in_([row.last_id for row in stats.values()])
+    )}
+    for scheduled in ScheduledJob.query.order_by(ScheduledJob.name):
+        if scheduled.name not in JOBS:
+            continue
+        row = stats.get(scheduled.name)
+        last_run = last_runs.get(row.last_id) if row else None
+        state = 'пауза' if scheduled.paused else f'следующий запуск {scheduled.next_run_at:%Y-%m-%d %H:%M}'
+        click.echo(f'{scheduled.name} [{scheduled.schedule}] {state}')
+        if row:
+            click.echo(f'  запусков: {row.runs}, ошибок: {row.failures}, '
+                       f'среднее время: {int(row.avg_ms or 0)} мс, '
+                       f'последний: {last_run.status} ({last_run.started_at:%Y-%m-%d %H:%M})')
+
+@jobs_cli.command('run')
+@click.argument('name')
+def jobs_run_command(name):
+    """Запустить задачу немедленно"""
+    _get_job_or_fail(name)
+    # Ждем поток даже после таймаута: иначе он погибнет вместе с процессом, не сняв аренду
+    run = run_job(name, force=True, wait=True)
+    if run is None:
+        raise click.ClickException(f'Задача {name} уже выполняется другим воркером')
+    click.echo(f'{name}: {run.status} за {run.duration_ms} мс')
+    if run.error:
+        click.echo(run.error)
+
+@jobs_cli.command('unlock')
+@click.argument('name')
+def jobs_unlock_command(name):
+    """Снять аренду задачи, если державший ее воркер аварийно завершился"""
+    _get_job_or_fail(name)
+    db.session.execute(
+        db.update(ScheduledJob).where(ScheduledJob.name == name).values(
+            lease_owner=None,
+            lease_expires_at=None
+        ).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    click.echo(f'Аренда задачи {name} снята')
+
+@jobs_cli.command('pause')
+@click.argument('name')
+def jobs_pause_command(name):
+    """Приостановить запуски задачи по расписанию"""
+    _get_job_or_fail(name).paused = True
+    db.session.commit()
+    click.echo(f'Задача {name} приостановлена')
+
+@jobs_cli.command('resume')
+@click.argument('name')
+def jobs_resume_command(name):
+    """Возобновить запуски задачи по расписанию"""
+    scheduled = _get_job_or_fail(name)
+    scheduled.paused = False
+    scheduled.next_run_at = next_run_time(scheduled.schedule, datetime.utcnow())
+    db.session.commit()
+    click.echo(f'Задача {name} возобновлена')
+
+@jobs_cli.command('worker')
+@click.option('--once', is_flag=True, help='Один проход и выход')
+def jobs_worker_command(once):
+    """Запустить воркер планировщика"""
+    worker_id = _worker_id()
+    # SIGTERM превращаем в обычный выход, чтобы сработал atexit и аренды зависших задач снялись
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    sync_jobs()
+    click.echo(f'Воркер {worker_id} запущен')
+    while True:
+        for run in run_due_jobs(worker_id):
+            click.echo(f'{run.job_name}: {run.status} за {run.duration_ms} мс')
+        if once:
+            break
+        time.sleep(app.config['JOBS_POLL_INTERVAL'])
+
 # Формы
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -130,6 +704,8 @@ def init_db():
     with app.app_context():
         # Создаем все таблицы
         db.create_all()
+        ensure_user_task_unique()
+        ensure_submission_index()
         print("Таблицы созданы успешно")
         
         # Проверяем, есть ли данные
@@ -140,6 +716,39 @@ def init_db():
         else:
             print("База данных уже содержит данные")
 
+@app.cli.command('init-db')
+def init_db_command():
+    """Создать таблицы, индексы и тестовые данные (нужно после обновления перед flask run)"""
+    init_db()
+
+def ensure_user_task_unique():
+    """Уникальный индекс (user_id, task_id) для баз, созданных до его появления"""
+    # Отдельное соединение, чтобы не коммитить чужие изменения в сессии
+    with db.engine.begin() as conn:
+        # Дубликаты могли остаться от гонок при старте задачи — оставляем самую продвинутую
+        # запись: выполненную, а среди равных — самую свежую
+        conn.execute(db.text(
+            'DELETE FROM user_task WHERE id NOT IN ('
+            '  SELECT id FROM ('
+            '    SELECT id, ROW_NUMBER() OVER ('
+            '      PARTITION BY user_id, task_id'
+            "      ORDER BY status = 'completed' DESC, COALESCE(completed_at, started_at) DESC, id DESC"
+            '    ) AS position FROM user_task'
+            '  ) WHERE position = 1'
+            ')'
+        ))
+        conn.execute(db.text(
+            'CREATE UNIQUE INDEX IF NOT EXISTS uq_user_task ON user_task (user_id, task_id)'
+        ))
+
+def ensure_submission_index():
+    """Индекс истории решений: create_all не добавляет индексы в уже существующие таблицы"""
+    with db.engine.begin() as conn:
+        conn.execute(db.text(
+            'CREATE INDEX IF NOT EXISTS ix_task_submission_user_task '
+            'ON task_submission (user_id, task_id, submitted_at)'
+        ))
+
 def create_sample_data():
     """Создание тестовых данных"""
     # Создаем тестового пользователя
@@ -329,9 +938,9 @@ def create_sample_data():
 @app.route('/')
 def index():
     """Главная страница"""
-    tasks = Task.query.order_by(db.func.random()).limit(3).all()
-    theory_count = Theory.query.count()
-    task_count = Task.query.count()
+    tasks = task_cards_query().order_by(db.func.random()).limit(3).all()
+    theory_count = db.session.query(db.func.count(Theory.id)).scalar()
+    task_count = db.session.query(db.func.count(Task.id)).scalar()
     roadmap_count = Roadmap.query.count()
     
     user_progress = None
@@ -434,7 +1043,7 @@ def profile():
             elif ut.status == 'in_progress':
                 in_progress_tasks.append(task_info)
     
-    total_tasks = Task.query.count()
+    total_tasks = db.session.query(db.func.count(Task.id)).scalar()
     completed_count = len(completed_tasks)
     progress_percentage = int((completed_count / total_tasks * 100)) if total_tasks > 0 else 0
     
@@ -451,7 +1060,7 @@ def tasks():
     category = request.args.get('category', 'all')
     difficulty = request.args.get('difficulty', 'all')
     
-    query = Task.query
+    query = task_cards_query()
     
     if category != 'all':
         query = query.filter_by(category=category)
@@ -480,7 +1089,7 @@ def tasks():
 @app.route('/task/<int:task_id>')
 def task_detail(task_id):
     """Детальная страница задания"""
-    task = Task.query.get_or_404(task_id)
+    task = Task.query.options(undefer_group('task_body')).get_or_404(task_id)
     form = TaskSubmissionForm()
     
     user_task = None
@@ -495,7 +1104,8 @@ def task_detail(task_id):
         submissions = TaskSubmission.query.filter_by(
             user_id=current_user.id, 
             task_id=task_id
-        ).order_by(TaskSubmission.submitted_at.desc()).all()
+        ).order_by(TaskSubmission.submitted_at.desc()) \
+            .limit(app.config['SUBMISSIONS_HOT_LIMIT']).all()
     
     return render_template('task_detail.html', 
                          task=task, 
@@ -503,31 +1113,24 @@ def task_detail(task_id):
                          user_task=user_task,
                          submissions=submissions)
 
+def flash_not_in_progress(task):
+    """Сообщение, когда задачу нельзя завершить: статус читается только в этом случае"""
+    if get_user_task_status(current_user.id, task.id) == 'completed':
+        flash(f'Задача "{task.title}" уже выполнена', 'info')
+    else:
+        flash('Сначала начните выполнение задачи', 'warning')
+
 @app.route('/task/<int:task_id>/start', methods=['POST'])
 @login_required
 def start_task(task_id):
     """Начать выполнение задачи"""
     task = Task.query.get_or_404(task_id)
     
-    user_task = UserTask.query.filter_by(
-        user_id=current_user.id, 
-        task_id=task_id
-    ).first()
-    
-    if not user_task:
-        user_task = UserTask(
-            user_id=current_user.id,
-            task_id=task_id,
-            status='in_progress',
-            started_at=datetime.utcnow(),
-            progress=0
-        )
-        db.session.add(user_task)
+    result = transition_user_task(current_user.id, task_id, 'in_progress')
+    if result == 'created':
         db.session.commit()
         flash(f'Вы начали выполнение задачи "{task.title}"', 'success')
-    elif user_task.status != 'in_progress':
-        user_task.status = 'in_progress'
-        user_task.started_at = datetime.utcnow()
+    elif result == 'updated':
         db.session.commit()
         flash(f'Вы продолжили выполнение задачи "{task.title}"', 'success')
     else:
@@ -543,17 +1146,12 @@ def submit_task(task_id):
     form = TaskSubmissionForm()
     
     if form.validate_on_submit():
-        # Проверяем, есть ли активная задача
-        user_task = UserTask.query.filter_by(
-            user_id=current_user.id, 
-            task_id=task_id
-        ).first()
-        
-        if not user_task or user_task.status != 'in_progress':
-            flash('Сначала начните выполнение задачи', 'warning')
+        # Завершаем задачу, только если она сейчас в работе
+        if not transition_user_task(current_user.id, task_id, 'completed'):
+            flash_not_in_progress(task)
             return redirect(url_for('task_detail', task_id=task_id))
         
-        # Создаем запись о решении
+        # Создаем запись о решении в той же транзакции
         submission = TaskSubmission(
             user_id=current_user.id,
             task_id=task_id,
@@ -562,11 +1160,6 @@ def submit_task(task_id):
             status='pending'
         )
         
-        # Обновляем статус задачи
-        user_task.status = 'completed'
-        user_task.progress = 100
-        user_task.completed_at = datetime.utcnow()
-        
         db.session.add(submission)
         db.session.commit()
         
@@ -582,19 +1175,11 @@ def complete_task(task_id):
     """Отметить задачу как выполненную"""
     task = Task.query.get_or_404(task_id)
     
-    user_task = UserTask.query.filter_by(
-        user_id=current_user.id, 
-        task_id=task_id
-    ).first()
-    
-    if user_task:
-        user_task.status = 'completed'
-        user_task.progress = 100
-        user_task.completed_at = datetime.utcnow()
+    if transition_user_task(current_user.id, task_id, 'completed'):
         db.session.commit()
         flash(f'Задача "{task.title}" отмечена как выполненная!', 'success')
     else:
-        flash('Сначала начните выполнение задачи', 'warning')
+        flash_not_in_progress(task)
     
     return redirect(url_for('task_detail', task_id=task_id))
 
@@ -630,7 +1215,7 @@ def theory():
     """Теоретические материалы"""
     category = request.args.get('category', 'all')
     
-    query = Theory.query
+    query = theory_cards_query()
     if category != 'all':
         query = query.filter_by(category=category)
     
@@ -645,16 +1230,162 @@ def blog():
 # API эндпоинты
 @app.route('/api/tasks/count')
 def get_tasks_count():
-    count = Task.query.count()
+    count = db.session.query(db.func.count(Task.id)).scalar()
     return jsonify({'count': count})
 
+# По умолчанию batch API отдает поля карточки.
+# Тяжелые текстовые колонки (requirements, solution_template) — только по запросу через fields
+TASK_API_DEFAULT_FIELDS = TASK_CARD_FIELDS
+TASK_API_FIELDS = TASK_API_DEFAULT_FIELDS + ('requirements', 'solution_template')
+
+def _api_error(message, status=400):
+    return jsonify({'error': message}), status
+
+def _api_json(payload):
+    """Компактная сериализация без сортировки ключей и отступов"""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+    return app.response_class(body, mimetype='application/json')
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Объект типа {type(value).__name__} не сериализуется в JSON')
+
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
+
+def _parse_id_list(raw):
+    """Разбор списка id из строки "1,2,3" или JSON-массива"""
+    if raw is None:
+        return []
+    if isinstance(raw, str):
+        raw = [part for part in raw.split(',') if part.strip()]
+    if not isinstance(raw, list):
+        raise ValueError('ids должен быть списком')
+    # Лимит проверяется до разбора, чтобы огромный список не занимал воркер
+    if len(raw) > app.config['API_BATCH_MAX_IDS']:
+        raise ValueError(f'Не более {app.config["API_BATCH_MAX_IDS"]} заданий за запрос')
+    ids = []
+    seen = set()
+    for value in raw:
+        if isinstance(value, int) and not isinstance(value, bool):
+            task_id = value
+        elif isinstance(value, str) and value.strip().isascii() and value.strip().isdigit():
+            task_id = int(value.strip())
+        else:
+            raise ValueError(f'Некорректный id задания: {value!r}')
+        if not 1 <= task_id <= SQLITE_MAX_INTEGER:
+            raise ValueError(f'id задания вне допустимого диапазона: {task_id}')
+        if task_id not in seen:
+            seen.add(task_id)
+            ids.append(task_id)
+    return ids
+
+def _parse_field_list(raw):
+    if raw is None:
+        return list(TASK_API_DEFAULT_FIELDS)
+    if isinstance(raw, str):
+        raw = [part.strip() for part in raw.split(',') if part.strip()]
+    if not isinstance(raw, list):
+        raise ValueError('fields должен быть списком')
+    unknown = [field for field in raw if field not in TASK_API_FIELDS]
+    if unknown:
+        raise ValueError(f'Неизвестные поля: {", ".join(map(str, unknown))}')
+    # id нужен всегда, чтобы сопоставить задание с состоянием пользователя
+    return ['id'] + [field for field in raw if field != 'id']
+
+def get_tasks_batch(task_ids, fields, user_id=None):
+    """Задания и состояние пользователя по списку id за фиксированное число запросов"""
+    tasks = Task.query.options(load_only(*[getattr(Task, field) for field in fields])) \
+        .filter(Task.id.in_(task_ids)).all()
+    tasks_by_id = {task.id: task for task in tasks}
+
+    user_tasks = {}
+    latest_submissions = {}
+    if user_id is not None and tasks_by_id:
+        found_ids = list(tasks_by_id)
+        for ut in UserTask.query.filter(UserTask.user_id == user_id,
+                                        UserTask.task_id.in_(found_ids)).all():
+            user_tasks[ut.task_id] = ut
+
+        # Последнее решение по каждому заданию одним запросом, без колонки с кодом
+        latest_ids = db.session.query(db.func.max(TaskSubmission.id)) \
+            .filter(TaskSubmission.user_id == user_id, TaskSubmission.task_id.in_(found_ids)) \
+            .group_by(TaskSubmission.task_id)
+        submissions = TaskSubmission.query.options(
+            load_only(TaskSubmission.id, TaskSubmission.task_id,
+                      TaskSubmission.status, TaskSubmission.submitted_at)
+        ).filter(TaskSubmission.id.in_(latest_ids.scalar_subquery())).all()
+        for submission in submissions:
+            latest_submissions[submission.task_id] = submission
+
+    result = []
+    for task_id in task_ids:
+        task = tasks_by_id.get(task_id)
+        if task is None:
+            continue
+        item = {field: getattr(task, field) for field in fields}
+        if user_id is not None:
+            ut = user_tasks.get(task_id)
+            item['user_task'] = {
+                'status': ut.status,
+                'progress': ut.progress,
+                'started_at': ut.started_at,
+                'completed_at': ut.completed_at
+            } if ut else None
+            submission = latest_submissions.get(task_id)
+            item['latest_submission'] = {
+                'id': submission.id,
+                'status': submission.status,
+                'submitted_at': submission.submitted_at
+            } if submission else None
+        result.append(item)
+
+    missing = [task_id for task_id in task_ids if task_id not in tasks_by_id]
+    return result, missing
+
+@app.route('/api/tasks', methods=['GET', 'POST'])
+def get_tasks_batch_api():
+    """Batch API: данные заданий и состояние текущего пользователя"""
+    if request.method == 'POST':
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return _api_error('Ожидается JSON-объект')
+        raw_ids, raw_fields = payload.get('ids'), payload.get('fields')
+    else:
+        raw_ids, raw_fields = request.args.get('ids'), request.args.get('fields')
+
+    try:
+        task_ids = _parse_id_list(raw_ids)
+        fields = _parse_field_list(raw_fields)
+    except (TypeError, ValueError) as e:
+        return _api_error(str(e))
+
+    if not task_ids:
+        return _api_error('Не указаны id заданий')
+
+    user_id = current_user.id if current_user.is_authenticated else None
+    tasks, missing = get_tasks_batch(task_ids, fields, user_id)
+    return _api_json({'tasks': tasks, 'missing': missing})
+
+@app.route('/api/task/<int:task_id>/submissions/archive')
+@login_required
+def get_archived_submissions_api(task_id):
+    """Старые решения текущего пользователя из архива"""
+    submissions = get_archived_submissions(current_user.id, task_id)
+    return _api_json({
+        'submissions': [
+            {field: getattr(submission, field) for field in ARCHIVED_SUBMISSION_FIELDS}
+            for submission in submissions
+        ]
+    })
+
 @app.route('/api/user/progress')
 @login_required
 def get_user_progress():
     user_tasks = UserTask.query.filter_by(user_id=current_user.id).all()
     completed = len([ut for ut in user_tasks if ut.status == 'completed'])
     in_progress = len([ut for ut in user_tasks if ut.status == 'in_progress'])
-    total_tasks = Task.query.count()
+    total_tasks = db.session.query(db.func.count(Task.id)).scalar()
     
     return jsonify({
         'completed': completed,
@@ -666,9 +1397,11 @@ def get_user_progress():
 @app.route('/api/stats')
 def get_stats():
     users_count = User.query.count()
-    tasks_count = Task.query.count()
-    theory_count = Theory.query.count()
-    submissions_count = TaskSubmission.query.count()
+    tasks_count = db.session.query(db.func.count(Task.id)).scalar()
+    theory_count = db.session.query(db.func.count(Theory.id)).scalar()
+    # Решения хранятся в двух базах: последние в основной, старые в архиве
+    submissions_count = db.session.query(db.func.count(TaskSubmission.id)).scalar() \
+        + db.session.query(db.func.count(ArchivedSubmission.id)).scalar()
     roadmaps_count = Roadmap.query.count()
     
     return jsonify({
@@ -688,6 +1421,158 @@ def page_not_found(e):
 def internal_server_error(e):
     return render_template('500.html'), 500
 
+# Статика: хеши в именах файлов, предсжатие и долгое кэширование
+ASSET_COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+ASSET_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # В порядке предпочтения
+ASSET_MANIFEST = {}
+
+# Ссылки на другие файлы внутри CSS: url(...) и @import "..."
+ASSET_CSS_REFERENCE = re.compile(r"""url\(\s*(['"]?)([^'")\s]+)\1\s*\)|@import\s+(['"])([^'"]+)\3""")
+
+def _asset_manifest_path():
+    return os.path.join(app.config['ASSETS_DIST_DIR'], 'manifest.json')
+
+def _load_asset_manifest():
+    ASSET_MANIFEST.clear()
+    if os.path.isfile(_asset_manifest_path()):
+        with open(_asset_manifest_path(), encoding='utf-8') as f:
+            ASSET_MANIFEST.update(json.load(f))
+
+def _asset_sources():
+    """Исходные файлы статики: относительный путь -> абсолютный"""
+    static_root = app.static_folder
+    dist_root = app.config['ASSETS_DIST_DIR']
+    sources = {}
+    for dirpath, dirnames, filenames in os.walk(static_root):
+        dirnames[:] = [d for d in dirnames
+                       if not d.startswith('.') and os.path.join(dirpath, d) != dist_root]
+        for filename in filenames:
+            if not filename.startswith('.'):
+                source = os.path.join(dirpath, filename)
+                sources[os.path.relpath(source, static_root).replace(os.sep, '/')] = source
+    return sources
+
+def build_assets():
+    """Сборка статики: копии с хешем содержимого в имени, .gz/.br версии и manifest.json.
+
+    Ссылки в CSS заменяются на хешированные имена, поэтому файлы, на которые
+    ссылается CSS, собираются раньше него.
+    """
+    dist_root = app.config['ASSETS_DIST_DIR']
+    sources = _asset_sources()
+    manifest = {}
+    in_progress = set()
+
+    def rewrite_css(rel_path, data):
+        css_dir = posixpath.dirname(rel_path)
+
+        def replace(match):
+            url = match.group(2) or match.group(4)
+            path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+            if not path or ':' in path or path.startswith('/'):
+                return match.group(0)  # Внешние, data: и абсолютные адреса не трогаем
+            reference = posixpath.normpath(posixpath.join(css_dir, path))
+            if reference not in sources or reference in in_progress:
+                return match.group(0)
+            hashed_reference = build(reference)
+            return match.group(0).replace(url, posixpath.relpath(hashed_reference, css_dir or '.') + suffix, 1)
+
+        text = data.decode('utf-8', 'surrogateescape')
+        return ASSET_CSS_REFERENCE.sub(replace, text).encode('utf-8', 'surrogateescape')
+
+    def build(rel_path):
+        if rel_path in manifest:
+            return manifest[rel_path]
+        with open(sources[rel_path], 'rb') as f:
+            data = f.read()
+
+        base, ext = posixpath.splitext(rel_path)
+        if ext.lower() == '.css':
+            in_progress.add(rel_path)
+            data = rewrite_css(rel_path, data)
+            in_progress.discard(rel_path)
+
+        hashed_path = f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        target = os.path.join(dist_root, *hashed_path.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+
+        if ext.lower() in ASSET_COMPRESSIBLE_EXTENSIONS:
+            variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(data)))
+            for suffix, compressed in variants:
+                # Сжатая версия нужна, только если она действительно меньше
+                if len(compressed) < len(data):
+                    with open(target + suffix, 'wb') as f:
+                        f.write(compressed)
+
+        manifest[rel_path] = hashed_path
+        return hashed_path
+
+    for rel_path in sorted(sources):
+        build(rel_path)
+
+    # Манифест пишется во временный файл и подменяется атомарно: процессы,
+    # которые в этот момент его читают, видят либо старую, либо новую версию
+    os.makedirs(dist_root, exist_ok=True)
+    manifest_path = _asset_manifest_path()
+    temp_path = f'{manifest_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+    ASSET_MANIFEST.clear()
+    ASSET_MANIFEST.update(manifest)
+    return manifest
+
+def asset_url_for(endpoint, **values):
+    """url_for для шаблонов: собранная статика отдается по адресу с хешем"""
+    # В режиме отладки файлы правят на ходу, поэтому отдаем исходники без долгого кэша
+    if endpoint == 'static' and not app.debug:
+        hashed_path = ASSET_MANIFEST.get(values.get('filename'))
+        if hashed_path:
+            endpoint = 'assets'
+            values['filename'] = hashed_path
+    return url_for(endpoint, **values)
+
+@app.route('/assets/<path:filename>')
+def assets(filename):
+    """Отдача собранной статики, по возможности предсжатой"""
+    path = safe_join(app.config['ASSETS_DIST_DIR'], filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    encoding = None
+    for name, suffix in ASSET_ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(path + suffix):
+            encoding, path = name, path + suffix
+            break
+
+    # send_file отдает файл через wsgi.file_wrapper, поэтому сервер может использовать sendfile
+    response = send_file(path,
+                         mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                         max_age=app.config['ASSETS_MAX_AGE'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+assets_cli = AppGroup('assets', help='Сборка статики')
+app.cli.add_command(assets_cli)
+
+@assets_cli.command('build')
+def assets_build_command():
+    """Собрать статику с хешами в именах и сжатыми версиями"""
+    manifest = build_assets()
+    click.echo(f'Собрано файлов: {len(manifest)}' + ('' if brotli else ' (brotli не установлен, только gzip)'))
+
+# Сборка — отдельный шаг (flask assets build), при импорте манифест только читается
+_load_asset_manifest()
+app.jinja_env.globals['url_for'] = asset_url_for
+
 # Глобальный контекстный процессор
 @app.context_processor
 def inject_now():
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+# Базы создаются во временной папке, поэтому переменную нужно задать до импорта app
+os.environ['INSTANCE_PATH'] = tempfile.mkdtemp(prefix='it-career-tests-')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app_module.app.config['TESTING'] = True
+    with app_module.app.app_context():
+        app_module.db.create_all()
+        app_module.ensure_user_task_unique()
+        yield app_module.app
+        app_module.db.session.remove()
+        app_module.db.drop_all()
+
+
+@pytest.fixture
+def sample_data(app):
+    app_module.create_sample_data()
+
+
+@pytest.fixture
+def sql_log(app):
+    """Список SQL-запросов, выполненных во время теста"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = app_module.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
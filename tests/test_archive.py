@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from app import ArchivedSubmission, TaskSubmission, archive_submissions, db
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    return client
+
+
+def add_submissions(user_id, task_id, count, start=datetime(2024, 1, 1)):
+    for i in range(count):
+        db.session.add(TaskSubmission(user_id=user_id, task_id=task_id, code=f'{user_id}-{task_id}-{i}',
+                                      submitted_at=start + timedelta(minutes=i)))
+    db.session.commit()
+
+
+def hot_codes(user_id, task_id):
+    return [s.code for s in TaskSubmission.query.filter_by(user_id=user_id, task_id=task_id)
+            .order_by(TaskSubmission.submitted_at)]
+
+
+def test_keeps_latest_submissions_per_user_and_task(app):
+    add_submissions(1, 1, 6)
+    add_submissions(1, 2, 2)
+    add_submissions(2, 1, 4)
+
+    archived = archive_submissions(keep=3, batch_size=2)
+
+    assert archived == 4
+    assert hot_codes(1, 1) == ['1-1-3', '1-1-4', '1-1-5']
+    assert hot_codes(1, 2) == ['1-2-0', '1-2-1']
+    assert hot_codes(2, 1) == ['2-1-1', '2-1-2', '2-1-3']
+    assert sorted(s.code for s in ArchivedSubmission.query) == ['1-1-0', '1-1-1', '1-1-2', '2-1-0']
+
+
+def test_max_batches_limits_a_run(app):
+    add_submissions(1, 1, 10)
+
+    assert archive_submissions(keep=2, batch_size=3, max_batches=2) == 6
+    assert TaskSubmission.query.count() == 4
+    assert archive_submissions(keep=2, batch_size=3) == 2
+    assert TaskSubmission.query.count() == 2
+
+
+def test_rerun_after_interrupted_batch(app):
+    add_submissions(1, 1, 5)
+    # Прерванный запуск: строки уже скопированы в архив, но не удалены из основной таблицы
+    old = TaskSubmission.query.order_by(TaskSubmission.submitted_at).first()
+    db.session.add(ArchivedSubmission(id=old.id, user_id=old.user_id, task_id=old.task_id,
+                                      code=old.code, submitted_at=old.submitted_at))
+    db.session.commit()
+
+    assert archive_submissions(keep=2) == 3
+
+    assert TaskSubmission.query.count() == 2
+    assert ArchivedSubmission.query.count() == 3
+
+
+def test_stats_count_archived_submissions(app):
+    add_submissions(1, 1, 6)
+    client = app.test_client()
+    before = client.get('/api/stats').get_json()['submissions']
+
+    archive_submissions(keep=2)
+
+    assert client.get('/api/stats').get_json()['submissions'] == before == 6
+
+
+def test_archive_endpoint_returns_own_archived_submissions(app, sample_data, client):
+    add_submissions(1, 1, 4)
+    add_submissions(2, 1, 4)
+    archive_submissions(keep=2)
+
+    response = client.get('/api/task/1/submissions/archive')
+
+    assert response.status_code == 200
+    submissions = response.get_json()['submissions']
+    assert [s['code'] for s in submissions] == ['1-1-1', '1-1-0']
+    assert all(s['user_id'] == 1 for s in submissions)
+
+
+def test_archive_endpoint_requires_login(app, sample_data):
+    response = app.test_client().get('/api/task/1/submissions/archive')
+
+    assert response.status_code == 302
+
+
+def test_submission_index_is_added_to_existing_table(app):
+    db.session.execute(db.text('DROP INDEX ix_task_submission_user_task'))
+    db.session.commit()
+
+    app_module.ensure_submission_index()
+
+    indexes = [row[1] for row in db.session.execute(db.text("PRAGMA index_list('task_submission')"))]
+    assert 'ix_task_submission_user_task' in indexes
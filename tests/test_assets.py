@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def static_root(tmp_path, monkeypatch):
+    root = tmp_path / 'static'
+    (root / 'css').mkdir(parents=True)
+    (root / 'images').mkdir()
+    (root / 'images' / 'a.png').write_bytes(b'PNG')
+    (root / 'css' / 'base.css').write_text('body{margin:0}')
+    (root / 'css' / 'main.css').write_text(
+        '@import "base.css";\n'
+        '.logo{background:url(../images/a.png)}\n'
+        '.icon{background:url("data:image/png;base64,AAA")}\n'
+        '.font{src:url(\'../images/a.png?#iefix\')}\n' * 20
+    )
+    monkeypatch.setattr(app_module.app, 'static_folder', str(root))
+    monkeypatch.setitem(app_module.app.config, 'ASSETS_DIST_DIR', str(root / 'dist'))
+    monkeypatch.setattr(app_module, 'ASSET_MANIFEST', {})
+    return root
+
+
+def test_css_references_point_to_hashed_files(static_root):
+    manifest = app_module.build_assets()
+
+    css = (static_root / 'dist' / manifest['css/main.css']).read_text()
+    image = os.path.basename(manifest['images/a.png'])
+    assert f'url(../images/{image})' in css
+    assert f"url('../images/{image}?#iefix')" in css
+    assert f'@import "{os.path.basename(manifest["css/base.css"])}"' in css
+    assert 'data:image/png;base64,AAA' in css
+
+
+def test_hashed_css_references_are_served(app, static_root):
+    manifest = app_module.build_assets()
+    client = app.test_client()
+
+    response = client.get(f'/assets/{manifest["images/a.png"]}')
+
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    css = client.get(f'/assets/{manifest["css/main.css"]}', headers={'Accept-Encoding': 'gzip'})
+    assert css.headers['Content-Encoding'] == 'gzip'
+
+
+def test_manifest_is_replaced_atomically(static_root):
+    app_module.build_assets()
+    app_module.build_assets()
+
+    dist_files = os.listdir(static_root / 'dist')
+    assert 'manifest.json' in dist_files
+    assert not [name for name in dist_files if name.endswith('.tmp')]
+
+
+def test_load_manifest_does_not_build(static_root):
+    app_module._load_asset_manifest()
+
+    assert app_module.ASSET_MANIFEST == {}
+    assert not (static_root / 'dist').exists()
+
+    manifest = app_module.build_assets()
+    app_module.ASSET_MANIFEST.clear()
+    app_module._load_asset_manifest()
+
+    assert app_module.ASSET_MANIFEST == manifest
@@ -0,0 +1,105 @@
+import threading
+import time
+from datetime import datetime
+
+import app as app_module
+from app import ScheduledJob, claim_job, db, next_run_time, run_job
+
+
+def register_job(monkeypatch, name, func, timeout=1):
+    monkeypatch.setitem(app_module.JOBS, name, {'func': func, 'schedule': 'interval:60', 'timeout': timeout})
+    app_module.sync_jobs()
+
+
+def test_cron_schedule():
+    assert next_run_time('*/15 * * * *', datetime(2024, 1, 1, 10, 7, 30)) == datetime(2024, 1, 1, 10, 15)
+    assert next_run_time('30 9 * * 1-5', datetime(2024, 1, 6, 10, 0)) == datetime(2024, 1, 8, 9, 30)
+
+
+def test_timed_out_job_keeps_lease_until_it_finishes(app, monkeypatch):
+    release = threading.Event()
+    finished = threading.Event()
+
+    def slow():
+        release.wait(5)
+        finished.set()
+
+    register_job(monkeypatch, 'slow', slow)
+
+    run = run_job('slow', 'worker-1', force=True)
+
+    assert run.status == 'timeout'
+    assert not claim_job('slow', 'worker-2', force=True)
+
+    release.set()
+    finished.wait(5)
+    for _ in range(50):
+        db.session.expire_all()
+        if db.session.get(ScheduledJob, 'slow').lease_owner is None:
+            break
+        time.sleep(0.1)
+
+    assert claim_job('slow', 'worker-2', force=True)
+    db.session.expire_all()
+    finished = db.session.get(app_module.JobRun, run.id)
+    assert finished.status == 'timeout'
+    assert finished.finished_at is not None
+    assert 'успешно' in finished.error
+
+
+def test_cli_run_waits_for_timed_out_job(app, monkeypatch):
+    def slow():
+        time.sleep(1.5)
+
+    register_job(monkeypatch, 'slow', slow)
+
+    result = app.test_cli_runner().invoke(args=['jobs', 'run', 'slow'])
+
+    assert 'slow: timeout' in result.output
+    db.session.expire_all()
+    assert db.session.get(ScheduledJob, 'slow').lease_owner is None
+    assert claim_job('slow', 'worker-2', force=True)
+
+
+def test_stuck_lease_is_released_on_exit(app, monkeypatch):
+    release = threading.Event()
+    register_job(monkeypatch, 'slow', lambda: release.wait(5))
+
+    run = run_job('slow', 'worker-1', force=True)
+    assert not claim_job('slow', 'worker-2', force=True)
+
+    app_module._release_stuck_jobs()
+
+    assert claim_job('slow', 'worker-2', force=True)
+    db.session.expire_all()
+    assert 'Процесс воркера завершился' in db.session.get(app_module.JobRun, run.id).error
+    release.set()
+    for _ in range(50):
+        db.session.expire_all()
+        if db.session.get(app_module.JobRun, run.id).finished_at is not None:
+            break
+        time.sleep(0.1)
+
+
+def test_unlock_clears_lease(app, monkeypatch):
+    register_job(monkeypatch, 'idle', lambda: None)
+    assert claim_job('idle', 'dead-worker', force=True)
+
+    result = app.test_cli_runner().invoke(args=['jobs', 'unlock', 'idle'])
+
+    assert result.exit_code == 0
+    assert claim_job('idle', 'worker-2', force=True)
+
+
+def test_failed_job_releases_lease(app, monkeypatch):
+    def boom():
+        raise RuntimeError('boom')
+
+    register_job(monkeypatch, 'boom', boom)
+
+    run = run_job('boom', 'worker-1', force=True)
+
+    assert run.status == 'failed'
+    assert 'RuntimeError' in run.error
+    db.session.expire_all()
+    assert db.session.get(ScheduledJob, 'boom').lease_owner is None
@@ -0,0 +1,60 @@
+import pytest
+
+import app as app_module
+
+HEAVY_COLUMNS = ('task.requirements', 'task.solution_template', 'theory.content')
+
+
+def assert_no_heavy_columns(statements):
+    selects = [statement for statement in statements if statement.lstrip().upper().startswith('SELECT')]
+    assert selects
+    for statement in selects:
+        for column in HEAVY_COLUMNS:
+            assert column not in statement, statement
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """Шаблоны не нужны для проверки запросов: подменяем рендеринг"""
+    calls = []
+
+    def fake_render_template(name, **context):
+        calls.append((name, context))
+        return name
+
+    monkeypatch.setattr(app_module, 'render_template', fake_render_template)
+    return calls
+
+
+def test_task_cards_query_skips_heavy_columns(sample_data, sql_log):
+    tasks = app_module.task_cards_query().all()
+
+    assert tasks
+    assert_no_heavy_columns(sql_log)
+
+
+def test_theory_cards_query_skips_heavy_columns(sample_data, sql_log):
+    items = app_module.theory_cards_query().all()
+
+    assert items
+    assert_no_heavy_columns(sql_log)
+
+
+@pytest.mark.parametrize('url', ['/', '/tasks', '/tasks?category=frontend', '/theory'])
+def test_listing_routes_skip_heavy_columns(app, sample_data, sql_log, rendered, url):
+    response = app.test_client().get(url)
+
+    assert response.status_code == 200
+    assert rendered
+    assert_no_heavy_columns(sql_log)
+
+
+def test_task_detail_loads_heavy_columns_in_one_query(app, sample_data, sql_log, rendered):
+    task_id = app_module.Task.query.first().id
+    sql_log.clear()
+
+    app.test_client().get(f'/task/{task_id}')
+
+    task = rendered[0][1]['task']
+    assert task.solution_template
+    assert any('task.solution_template' in statement for statement in sql_log)
@@ -0,0 +1,101 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+import app as app_module
+from app import UserTask, db, transition_user_task
+
+USER_ID = 1
+TASK_ID = 1
+
+
+def user_task_rows():
+    db.session.expire_all()
+    return UserTask.query.filter_by(user_id=USER_ID, task_id=TASK_ID).all()
+
+
+def run_in_parallel(app, status, workers=8):
+    results = []
+    barrier = threading.Barrier(workers)
+
+    def worker():
+        with app.app_context():
+            barrier.wait()
+            results.append(transition_user_task(USER_ID, TASK_ID, status))
+            db.session.commit()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_parallel_start_creates_single_row(app):
+    results = run_in_parallel(app, 'in_progress')
+
+    assert results.count('created') == 1
+    assert results.count(None) == len(results) - 1
+    rows = user_task_rows()
+    assert len(rows) == 1
+    assert rows[0].status == 'in_progress'
+
+
+def test_parallel_complete_applies_once(app):
+    transition_user_task(USER_ID, TASK_ID, 'in_progress')
+    db.session.commit()
+
+    results = run_in_parallel(app, 'completed')
+
+    assert results.count('updated') == 1
+    assert results.count(None) == len(results) - 1
+    assert [row.status for row in user_task_rows()] == ['completed']
+
+
+def test_complete_requires_in_progress(app):
+    assert transition_user_task(USER_ID, TASK_ID, 'completed') is None
+    assert user_task_rows() == []
+
+
+def test_restart_resets_progress(app):
+    transition_user_task(USER_ID, TASK_ID, 'in_progress')
+    transition_user_task(USER_ID, TASK_ID, 'completed')
+    db.session.commit()
+    first_started_at = user_task_rows()[0].started_at
+
+    assert transition_user_task(USER_ID, TASK_ID, 'in_progress') == 'updated'
+    db.session.commit()
+
+    row, = user_task_rows()
+    assert (row.status, row.progress, row.completed_at) == ('in_progress', 0, None)
+    assert row.started_at == first_started_at
+
+
+def test_start_is_single_statement(app, sql_log):
+    for expected in ('created', None):
+        sql_log.clear()
+        assert transition_user_task(USER_ID, TASK_ID, 'in_progress') == expected
+        assert len(sql_log) == 1
+
+
+def test_unknown_status_is_rejected(app):
+    with pytest.raises(ValueError):
+        transition_user_task(USER_ID, TASK_ID, 'archived')
+
+
+def test_unique_index_keeps_most_advanced_duplicate(app):
+    # База, созданная до появления уникального индекса, с дубликатами от гонок
+    db.session.execute(db.text('DROP INDEX uq_user_task'))
+    db.session.add_all([
+        UserTask(user_id=USER_ID, task_id=TASK_ID, status='completed', progress=100,
+                 started_at=datetime(2024, 1, 1), completed_at=datetime(2024, 1, 2)),
+        UserTask(user_id=USER_ID, task_id=TASK_ID, status='in_progress', started_at=datetime(2024, 1, 3)),
+    ])
+    db.session.commit()
+
+    app_module.ensure_user_task_unique()
+
+    assert [row.status for row in user_task_rows()] == ['completed']
+    assert transition_user_task(USER_ID, TASK_ID, 'in_progress') == 'updated'
@@ -0,0 +1,102 @@
+import pytest
+
+import app as app_module
+from app import TaskSubmission, UserTask, db
+
+
+@pytest.fixture
+def client(app, sample_data):
+    return app.test_client()
+
+
+def login(client, user_id=1):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+def task_ids():
+    return [task.id for task in app_module.Task.query.order_by(app_module.Task.id)]
+
+
+def test_get_returns_tasks_in_requested_order(client):
+    first, second = task_ids()[:2]
+
+    response = client.get(f'/api/tasks?ids={second},{first},999')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [task['id'] for task in data['tasks']] == [second, first]
+    assert data['missing'] == [999]
+    assert 'user_task' not in data['tasks'][0]
+
+
+def test_post_includes_user_state(client):
+    first, second = task_ids()[:2]
+    db.session.add(UserTask(user_id=1, task_id=first, status='in_progress', progress=40))
+    db.session.add_all([
+        TaskSubmission(user_id=1, task_id=first, code='old'),
+        TaskSubmission(user_id=1, task_id=first, code='new', status='reviewed'),
+    ])
+    db.session.commit()
+    latest_id = TaskSubmission.query.filter_by(code='new').one().id
+    login(client)
+
+    response = client.post('/api/tasks', json={'ids': [first, second], 'fields': ['title']})
+
+    assert response.status_code == 200
+    tasks = response.get_json()['tasks']
+    assert set(tasks[0]) == {'id', 'title', 'user_task', 'latest_submission'}
+    assert tasks[0]['user_task']['progress'] == 40
+    assert tasks[0]['latest_submission'] == {
+        'id': latest_id, 'status': 'reviewed', 'submitted_at': tasks[0]['latest_submission']['submitted_at']
+    }
+    assert tasks[1]['user_task'] is None
+    assert tasks[1]['latest_submission'] is None
+
+
+def test_heavy_columns_only_when_requested(client, sql_log):
+    ids = ','.join(map(str, task_ids()))
+
+    default = client.get(f'/api/tasks?ids={ids}').get_json()['tasks']
+    assert 'solution_template' not in default[0]
+    assert not any('task.solution_template' in s or 'task.requirements' in s for s in sql_log)
+
+    sql_log.clear()
+    requested = client.get(f'/api/tasks?ids={ids}&fields=title,solution_template').get_json()['tasks']
+    assert requested[0]['solution_template']
+    assert any('task.solution_template' in s for s in sql_log)
+    assert not any('task.requirements' in s for s in sql_log)
+
+
+def test_query_count_does_not_grow_with_ids(client, sql_log):
+    login(client)
+    ids = task_ids()
+    client.get(f'/api/tasks?ids={ids[0]}')  # Пользователь загружается первым запросом
+    counts = []
+    for size in (1, len(ids)):
+        sql_log.clear()
+        client.get(f'/api/tasks?ids={",".join(map(str, ids[:size]))}')
+        counts.append(len(sql_log))
+
+    # Задания, состояние пользователя и последние решения
+    assert counts == [3, 3]
+
+
+@pytest.mark.parametrize('method, kwargs', [
+    ('get', {'query_string': {'ids': ''}}),
+    ('get', {'query_string': {'ids': '1,abc'}}),
+    ('get', {'query_string': {'ids': '99999999999999999999999'}}),
+    ('get', {'query_string': {'ids': '1', 'fields': 'password'}}),
+    ('post', {'json': [1, 2]}),
+    ('post', {'json': {'ids': [True, 1.9, '2']}}),
+    ('post', {'json': {'ids': [0]}}),
+    ('post', {'json': {'ids': [2 ** 70]}}),
+    ('post', {'json': {'ids': list(range(1, 1000))}}),
+    ('post', {'json': {'ids': [1], 'fields': {'title': True}}}),
+])
+def test_bad_requests(client, method, kwargs):
+    response = getattr(client, method)('/api/tasks', **kwargs)
+
+    assert response.status_code == 400
+    assert response.get_json()['error']